@@ -1,38 +1,32 @@
 from flask import Flask, request, jsonify
-import pandas as pd
+import hmac
+import itertools
+import os
+import threading
+import numpy as np
 import torch
-from sentence_transformers import SentenceTransformer, util
+from sentence_transformers import util
 import spacy
 from keybert import KeyBERT
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 import torch.nn.functional as F
+from catalogue import SnapshotManager, list_versions
+from study_groups import StudyGroupStore
 
 
-# ✅ Load books dataset from CSV
-BOOKS_CSV_PATH = "books_dataset.csv"
-books_df = pd.read_csv(BOOKS_CSV_PATH)
+# ✅ Load the active catalogue snapshot (books, friends, embeddings & TF-IDF indexes)
+# Build new ones offline with `python catalogue.py --activate`; running workers pick them up without a restart
+catalogue = SnapshotManager()
+catalogue.bootstrap()
 
-# ✅ Convert DataFrame to list of dictionaries (to maintain previous data structure)
-books_data = books_df.to_dict(orient="records")
+# Books listed by users; kept outside the immutable snapshots so they survive a catalogue swap
+market_listings = []
+market_lock = threading.Lock()
+listing_ids = itertools.count(len(catalogue.current().books_data) + 1)  # Never reused, whatever snapshot is live
 
-# Load CSV file
-friends_df = pd.read_csv("friend_data.csv", encoding="utf-8")
-
-# 🔹 Normalize column names (convert to lowercase & strip spaces)
-friends_df.columns = friends_df.columns.str.strip().str.lower()
-
-# Debugging: Print column names after conversion
-print("Processed column names:", friends_df.columns.tolist())
-
-# 🔹 Ensure 'preferences' column exists
-if "preferences" in friends_df.columns:
-    friends_df["preferences"] = friends_df["preferences"].fillna("").apply(lambda x: x.split(", ") if isinstance(x, str) else [])
-else:
-    raise KeyError(f"❌ ERROR: 'preferences' column not found! Available columns: {friends_df.columns.tolist()}")
-
-# 🔹 Convert DataFrame to list of dictionaries
-friend_data = friends_df.to_dict(orient="records")
+# Admin routes are disabled unless a token is configured
+ADMIN_TOKEN = os.environ.get("BOOK_EXCHANGE_ADMIN_TOKEN")
 
 # 🔹 Store leaderboard in-memory
 leaderboard_data = [
@@ -116,12 +110,16 @@ app = Flask(__name__)
 nlp = spacy.load("en_core_web_sm")  # Small model for named entity recognition
 kw_model = KeyBERT()  # KeyBERT for keyword extraction
 
-# Load pre-trained sentence transformer for text similarity
-model = SentenceTransformer("all-MiniLM-L6-v2")  # Lightweight and efficient model
+# Persistent study groups, seeded from the list above on first run
+study_group_store = StudyGroupStore(study_groups, catalogue.current().model)
 
-# Ensure book descriptions are cleaned and tokenized
-book_descriptions = [book["description"] for book in books_data]
-book_embeddings = model.encode(book_descriptions, convert_to_tensor=True)
+# Re-embed group topics before a snapshot with a different encoder goes live
+def reindex_study_groups(snapshot):
+    if snapshot.model is not study_group_store.model:
+        study_group_store.reindex(snapshot.model)
+
+catalogue.listeners.append(reindex_study_groups)
+catalogue.watch()
 
 # In-memory user storage
 users = {}  # {username: {"points": int, "books_shared": int, "categories": [], "friends": []}}
@@ -152,17 +150,22 @@ def match_books():
     if username not in users:
         return jsonify({"error": "User not found!"}), 403
 
+    snapshot = catalogue.current()
+    listings = list(market_listings)
+    books_data = snapshot.books_data + listings
     user_preferences = " ".join(users[username].get("categories", []))
 
     if not user_preferences.strip():
         return jsonify({"message": "No preferences found. Showing popular books.", "matched_books": books_data[:5]})
 
-    # Convert user preferences and books to TF-IDF vectors
-    vectorizer = TfidfVectorizer()
-    tfidf_matrix = vectorizer.fit_transform([user_preferences] + [book["description"] for book in books_data])
+    # Project user preferences into the snapshot's precomputed TF-IDF space
+    user_vector = snapshot.book_vectorizer.transform([user_preferences])
 
-    # Compute cosine similarity scores
-    similarity_scores = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:]).flatten()
+    # Compute cosine similarity scores; user listings are projected into the same space and ranked alongside
+    similarity_scores = cosine_similarity(user_vector, snapshot.book_tfidf).flatten()
+    if listings:
+        listing_tfidf = snapshot.book_vectorizer.transform([book["description"] for book in listings])
+        similarity_scores = np.concatenate([similarity_scores, cosine_similarity(user_vector, listing_tfidf).flatten()])
 
     # Get top 10 recommended books
     top_indices = similarity_scores.argsort()[-10:][::-1]
@@ -175,6 +178,7 @@ def search_book():
     title = request.args.get("title", "")
     if not title:
         return jsonify({"error": "Book title is required"}), 400
+    books_data = market_books()
     best_match, score = process.extractOne(title, [book["title"] for book in books_data])
     if score < 60:
         return jsonify({"message": "No close matches found.", "book": None})
@@ -210,6 +214,9 @@ def chat_recommendations():
     if not conversation:
         return jsonify({"error": "Conversation is empty"}), 400
 
+    snapshot = catalogue.current()
+    books_data = snapshot.books_data
+
     # Extract keywords using a language model
     doc = nlp(conversation)
     extracted_entities = [ent.text for ent in doc.ents]  # Named entities
@@ -234,10 +241,10 @@ def chat_recommendations():
 
     # Convert extracted keywords to embeddings
     query_text = " ".join(extracted_entities[:5])  # Take only the top 5 keywords
-    query_embedding = model.encode(query_text, convert_to_tensor=True)
+    query_embedding = snapshot.model.encode(query_text, convert_to_tensor=True)
 
     # Compute similarity between user query and book dataset embeddings
-    similarity_scores = util.pytorch_cos_sim(query_embedding, book_embeddings)[0]
+    similarity_scores = util.pytorch_cos_sim(query_embedding.cpu(), snapshot.book_embeddings)[0]
 
     top_indices = torch.argsort(similarity_scores, descending=True)[:10]  # Pick top 10
     import random
@@ -258,16 +265,15 @@ def recommend_friends():
     if not user_preferences:
         return jsonify({"matched_friends": []})
 
-    # Convert preferences into strings for vectorization
-    friend_preferences = [" ".join(f.get("preferences", [])) for f in friend_data]
+    snapshot = catalogue.current()
+    friend_data = snapshot.friend_data
     user_pref_str = " ".join(user_preferences)
 
-    # ✅ Use TF-IDF for text vectorization (not embeddings)
-    vectorizer = TfidfVectorizer(stop_words="english", lowercase=True, max_df=0.85)
-    tfidf_matrix = vectorizer.fit_transform([user_pref_str] + friend_preferences)
+    # ✅ Use the snapshot's precomputed TF-IDF index (not embeddings)
+    user_vector = snapshot.friend_vectorizer.transform([user_pref_str])
 
     # ✅ Compute cosine similarity correctly using sklearn
-    similarity_scores = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:]).flatten()
+    similarity_scores = cosine_similarity(user_vector, snapshot.friend_tfidf).flatten()
 
     # ✅ Ensure scores are correctly ranked and sorted
     ranked_friends = sorted(zip(friend_data, similarity_scores), key=lambda x: x[1], reverse=True)[:5]
@@ -277,9 +283,24 @@ def recommend_friends():
 
     return jsonify({"matched_friends": matched_friends})
 
+@app.route("/friends", methods=["GET"])
+def friends():
+    return jsonify({"friends": catalogue.current().friend_data})
+
+@app.route("/shop", methods=["GET"])
+def shop():
+    return jsonify({"shop_items": shop_items})
+
+@app.route("/leaderboard", methods=["GET"])
+def leaderboard():
+    return jsonify({"leaderboard": leaderboard_data})
+
+def market_books():
+    return catalogue.current().books_data + market_listings
+
 @app.route("/market", methods=["GET"])
 def market():
-    return jsonify({"market_books": books_data})
+    return jsonify({"market_books": market_books()})
 
 @app.route("/market/add", methods=["POST"])
 def sell_book():
@@ -290,15 +311,134 @@ def sell_book():
     price = data.get("price")
     if not username or not title or not price:
         return jsonify({"error": "All fields are required!"}), 400
-    new_book = {
-        "id": len(books_data) + 1,
-        "title": title,
-        "description": description,
-        "price": int(price),
-        "seller": username
-    }
-    books_data.append(new_book)
-    return jsonify({"message": "✅ Book listed for sale!", "market_books": books_data})
+    with market_lock:
+        new_book = {
+            "id": next(listing_ids),
+            "title": title,
+            "description": description,
+            "price": int(price),
+            "seller": username
+        }
+        market_listings.append(new_book)
+    return jsonify({"message": "✅ Book listed for sale!", "market_books": market_books()})
+
+# 🔹 Study Groups
+@app.route("/study_groups", methods=["GET"])
+def list_study_groups():
+    return jsonify({"study_groups": study_group_store.list_groups()})
+
+@app.route("/study_groups/mine", methods=["GET"])
+def my_study_groups():
+    username = request.args.get("username")
+    if not username:
+        return jsonify({"error": "Username is required!"}), 400
+    return jsonify({"study_groups": study_group_store.groups_for_user(username)})
+
+@app.route("/study_groups/suggest", methods=["GET"])
+def suggest_study_groups():
+    username = request.args.get("username")
+    if username not in users:
+        return jsonify({"error": "User not found!"}), 403
+    suggested = study_group_store.suggest(username, users[username].get("categories", []))
+    return jsonify({"suggested_groups": suggested})
+
+@app.route("/study_groups/join", methods=["POST"])
+def join_study_group():
+    data = request.get_json()
+    username = data.get("username")
+    group_name = data.get("group_name")
+    if not username or not group_name:
+        return jsonify({"error": "Username and group name are required!"}), 400
+    if not study_group_store.join(group_name, username):
+        return jsonify({"error": "Study group not found!"}), 404
+    return jsonify({"message": f"✅ You joined {group_name}!", "group": study_group_store.get_group(group_name)})
+
+@app.route("/study_groups/leave", methods=["POST"])
+def leave_study_group():
+    data = request.get_json()
+    username = data.get("username")
+    group_name = data.get("group_name")
+    if not username or not group_name:
+        return jsonify({"error": "Username and group name are required!"}), 400
+    if not study_group_store.leave(group_name, username):
+        return jsonify({"error": "Study group not found!"}), 404
+    return jsonify({"message": f"You left {group_name}.", "group": study_group_store.get_group(group_name)})
+
+@app.route("/study_groups/discussion", methods=["GET"])
+def get_discussion():
+    group_name = request.args.get("group_name")
+    if study_group_store.get_group(group_name) is None:
+        return jsonify({"error": "Study group not found!"}), 404
+    try:
+        limit = min(max(int(request.args.get("limit", 20)), 1), 100)
+        # `cursor` pages forward from the oldest message; otherwise return the newest page, paging back with `before`
+        if "cursor" in request.args:
+            cursor = max(int(request.args["cursor"]), 0)
+            messages, next_cursor = study_group_store.get_messages(group_name, cursor, limit)
+            return jsonify({"messages": messages, "next_cursor": next_cursor})
+        before = int(request.args["before"]) if "before" in request.args else None
+    except ValueError:
+        return jsonify({"error": "Cursor, before and limit must be integers!"}), 400
+    messages, older_cursor = study_group_store.get_latest_messages(group_name, before, limit)
+    return jsonify({"messages": messages, "older_cursor": older_cursor})
+
+@app.route("/study_groups/discussion", methods=["POST"])
+def post_discussion():
+    data = request.get_json()
+    username = data.get("username")
+    group_name = data.get("group_name")
+    message = (data.get("message") or "").strip()
+    if not username or not group_name or not message:
+        return jsonify({"error": "All fields are required!"}), 400
+    if study_group_store.get_group(group_name) is None:
+        return jsonify({"error": "Study group not found!"}), 404
+    if not study_group_store.is_member(group_name, username):
+        return jsonify({"error": "Join the group before posting!"}), 403
+    entry = study_group_store.post_message(group_name, username, message)
+    return jsonify({"message": "💬 Posted!", "entry": entry})
+
+# 🔹 Catalogue Snapshots
+def admin_denied():
+    token = request.headers.get("X-Admin-Token", "")
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Admin routes are disabled. Set BOOK_EXCHANGE_ADMIN_TOKEN to enable them."}), 403
+    if not hmac.compare_digest(token, ADMIN_TOKEN):
+        return jsonify({"error": "Invalid admin token!"}), 401
+    return None
+
+@app.route("/admin/snapshot", methods=["GET"])
+def snapshot_status():
+    denied = admin_denied()
+    if denied:
+        return denied
+    return jsonify(catalogue.status())
+
+@app.route("/admin/snapshot/activate", methods=["POST"])
+def activate_snapshot():
+    denied = admin_denied()
+    if denied:
+        return denied
+    data = request.get_json()
+    version = data.get("version")
+    if version not in list_versions(catalogue.snapshot_dir):
+        return jsonify({"error": "Snapshot version not found!"}), 404
+    # CURRENT only moves (and other workers only follow) once the version has loaded here
+    if not catalogue.load_async(version, publish=True):
+        return jsonify({"error": "A snapshot is already loading. Try again shortly.", **catalogue.status()}), 409
+    return jsonify({"message": f"🔄 Loading snapshot {version} in the background.", **catalogue.status()}), 202
+
+@app.route("/admin/snapshot/rollback", methods=["POST"])
+def rollback_snapshot():
+    denied = admin_denied()
+    if denied:
+        return denied
+    result = catalogue.rollback()
+    if result is None:
+        return jsonify({"error": "No previous snapshot to roll back to, or one is already loading!"}), 409
+    version, switched = result
+    if not switched:
+        return jsonify({"message": f"⏪ Loading snapshot {version} in the background.", **catalogue.status()}), 202
+    return jsonify({"message": f"⏪ Rolled back to snapshot {version}.", **catalogue.status()})
 
 if __name__ == "__main__":
     app.run(host="127.0.0.1", port=5000, debug=False)
\ No newline at end of file
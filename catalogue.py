@@ -0,0 +1,356 @@
+import argparse
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+import torch
+from sentence_transformers import SentenceTransformer
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+
+BOOKS_CSV_PATH = "books_dataset.csv"
+FRIENDS_CSV_PATH = "friend_data.csv"
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+# Each snapshot is an immutable directory under SNAPSHOT_DIR; CURRENT names the live one and
+# PREVIOUS the one it replaced, so every worker agrees on what a rollback goes back to
+SNAPSHOT_DIR = "snapshots"
+CURRENT_POINTER = "CURRENT"
+PREVIOUS_POINTER = "PREVIOUS"
+BOOTSTRAP_LOCK = "bootstrap.lock"
+
+
+def load_friends_df(path):
+    friends_df = pd.read_csv(path, encoding="utf-8")
+
+    # 🔹 Normalize column names (convert to lowercase & strip spaces)
+    friends_df.columns = friends_df.columns.str.strip().str.lower()
+    if "preferences" not in friends_df.columns:
+        raise KeyError(f"❌ ERROR: 'preferences' column not found! Available columns: {friends_df.columns.tolist()}")
+    return friends_df
+
+
+def split_preferences(friends_df):
+    friends_df = friends_df.copy()
+    friends_df["preferences"] = friends_df["preferences"].fillna("").apply(lambda x: x.split(", ") if isinstance(x, str) else [])
+    return friends_df
+
+
+def build_snapshot(books_csv=BOOKS_CSV_PATH, friends_csv=FRIENDS_CSV_PATH, model_name=MODEL_NAME,
+                   snapshot_dir=SNAPSHOT_DIR, model=None):
+    """Build a new snapshot offline and return its version. Nothing already on disk is modified."""
+    version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    final_path = os.path.join(snapshot_dir, version)
+    tmp_path = f"{final_path}.tmp"
+    os.makedirs(tmp_path)
+
+    try:
+        books_df = pd.read_csv(books_csv)
+        friends_df = load_friends_df(friends_csv)
+        friend_data = split_preferences(friends_df).to_dict(orient="records")
+
+        # 🔹 Sentence embeddings for chat recommendations
+        model = model or SentenceTransformer(model_name)
+        book_embeddings = model.encode(books_df["description"].tolist(), convert_to_tensor=True)
+
+        # 🔹 TF-IDF indexes, fitted once on the catalogue instead of on every request
+        book_vectorizer = TfidfVectorizer()
+        book_tfidf = book_vectorizer.fit_transform(books_df["description"].tolist())
+        friend_vectorizer = TfidfVectorizer(stop_words="english", lowercase=True, max_df=0.85)
+        friend_tfidf = friend_vectorizer.fit_transform([" ".join(f["preferences"]) for f in friend_data])
+
+        books_df.to_csv(os.path.join(tmp_path, "books.csv"), index=False)
+        friends_df.to_csv(os.path.join(tmp_path, "friends.csv"), index=False)
+        torch.save(book_embeddings.cpu(), os.path.join(tmp_path, "book_embeddings.pt"))
+        with open(os.path.join(tmp_path, "tfidf.pkl"), "wb") as f:
+            pickle.dump({
+                "book_vectorizer": book_vectorizer,
+                "book_tfidf": book_tfidf,
+                "friend_vectorizer": friend_vectorizer,
+                "friend_tfidf": friend_tfidf,
+            }, f)
+        with open(os.path.join(tmp_path, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "version": version,
+                "model_name": model_name,
+                "books": len(books_df),
+                "friends": len(friend_data),
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            }, f, indent=2)
+    except BaseException:
+        # BaseException so a Ctrl-C mid-build doesn't leave a half-written snapshot behind
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    # Only fully written snapshots ever appear under their final name
+    os.replace(tmp_path, final_path)
+    return version
+
+
+def list_versions(snapshot_dir=SNAPSHOT_DIR):
+    if not os.path.isdir(snapshot_dir):
+        return []
+    # Builds in progress live in `<version>.tmp` and must never be activated
+    return sorted(name for name in os.listdir(snapshot_dir)
+                  if not name.endswith(".tmp") and os.path.exists(os.path.join(snapshot_dir, name, "manifest.json")))
+
+
+def _read_pointer(name, snapshot_dir):
+    try:
+        with open(os.path.join(snapshot_dir, name), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _write_pointer(name, version, snapshot_dir):
+    pointer_path = os.path.join(snapshot_dir, name)
+    tmp_path = f"{pointer_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_path, pointer_path)
+
+
+def read_current_version(snapshot_dir=SNAPSHOT_DIR):
+    return _read_pointer(CURRENT_POINTER, snapshot_dir)
+
+
+def read_previous_version(snapshot_dir=SNAPSHOT_DIR):
+    return _read_pointer(PREVIOUS_POINTER, snapshot_dir)
+
+
+def write_current_version(version, snapshot_dir=SNAPSHOT_DIR):
+    """Point CURRENT at `version`, recording the version it replaces in PREVIOUS."""
+    if version not in list_versions(snapshot_dir):
+        raise ValueError(f"Unknown snapshot version: {version}")
+    replaced = read_current_version(snapshot_dir)
+    if replaced and replaced != version:
+        _write_pointer(PREVIOUS_POINTER, replaced, snapshot_dir)
+    _write_pointer(CURRENT_POINTER, version, snapshot_dir)
+
+
+class Snapshot:
+    """Everything a request needs from one catalogue version, loaded read-only into memory."""
+
+    def __init__(self, path, model):
+        with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.version = self.manifest["version"]
+        self.model_name = self.manifest["model_name"]
+        self.model = model
+
+        self.books_data = pd.read_csv(os.path.join(path, "books.csv")).to_dict(orient="records")
+        self.friend_data = split_preferences(load_friends_df(os.path.join(path, "friends.csv"))).to_dict(orient="records")
+        self.book_embeddings = torch.load(os.path.join(path, "book_embeddings.pt"))
+
+        with open(os.path.join(path, "tfidf.pkl"), "rb") as f:
+            tfidf = pickle.load(f)
+        self.book_vectorizer = tfidf["book_vectorizer"]
+        self.book_tfidf = tfidf["book_tfidf"]
+        self.friend_vectorizer = tfidf["friend_vectorizer"]
+        self.friend_tfidf = tfidf["friend_tfidf"]
+
+
+class SnapshotManager:
+    """Serves one snapshot at a time and swaps in new versions without blocking requests."""
+
+    def __init__(self, snapshot_dir=SNAPSHOT_DIR):
+        self.snapshot_dir = snapshot_dir
+        self.lock = threading.Lock()
+        self.models = {}  # {model_name: SentenceTransformer} for the active and previous snapshots only
+        self.listeners = []  # Called with each snapshot before it goes live; raising abandons the switch
+        self.active = None
+        self.previous = None
+        self.loading = None
+        self.last_error = None
+        self.failed_version = None  # The watcher won't retry this until CURRENT changes
+
+    def current(self):
+        # Requests grab the reference once and use it throughout, so a swap never mixes versions
+        return self.active
+
+    def _get_model(self, model_name):
+        if model_name not in self.models:
+            self.models[model_name] = SentenceTransformer(model_name)
+        return self.models[model_name]
+
+    def _prune_models(self):
+        # Each encoder is a full SentenceTransformer, so drop any no snapshot in memory still uses
+        with self.lock:
+            keep = {snapshot.model_name for snapshot in (self.active, self.previous) if snapshot is not None}
+            self.models = {name: model for name, model in self.models.items() if name in keep}
+
+    def _activate(self, snapshot):
+        for listener in self.listeners:
+            listener(snapshot)
+        with self.lock:
+            if self.active is not None and self.active.version != snapshot.version:
+                self.previous = self.active
+            self.active = snapshot
+        self._prune_models()
+
+    def load(self, version):
+        """Load a version from disk and switch to it. Blocks until done."""
+        path = os.path.join(self.snapshot_dir, version)
+        try:
+            with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+                model_name = json.load(f)["model_name"]
+            snapshot = Snapshot(path, self._get_model(model_name))
+            self._activate(snapshot)
+        except Exception:
+            self._prune_models()
+            raise
+        return snapshot
+
+    def load_async(self, version, publish=False):
+        """Load a version in a background thread; the old snapshot keeps serving until it is ready.
+
+        With `publish`, CURRENT is only moved once the version has loaded here, so other workers
+        (and any that restart) never get pointed at a snapshot that doesn't work.
+        """
+        with self.lock:
+            if self.loading is not None:
+                return False
+            self.loading = version
+
+        def run():
+            try:
+                self.load(version)
+                if publish:
+                    write_current_version(version, self.snapshot_dir)
+                self.last_error = None
+                self.failed_version = None
+            except Exception as e:
+                self.last_error = f"{version}: {e}"
+                self.failed_version = version
+            finally:
+                with self.lock:
+                    self.loading = None
+
+        threading.Thread(target=run, daemon=True).start()
+        return True
+
+    def rollback(self):
+        """Switch back to the version recorded in PREVIOUS.
+
+        Returns `(version, switched)`, or None if there is nothing to roll back to. The swap is
+        immediate when that version is still in memory; otherwise it is loaded in the background.
+        """
+        target = read_previous_version(self.snapshot_dir)
+        if target is None or target not in list_versions(self.snapshot_dir):
+            return None
+
+        with self.lock:
+            snapshot = self.previous if self.previous is not None and self.previous.version == target else None
+        if snapshot is None:
+            if not self.load_async(target, publish=True):
+                return None
+            return target, False
+
+        self._activate(snapshot)
+        # Move CURRENT as well, otherwise the watcher would switch straight back
+        write_current_version(target, self.snapshot_dir)
+        return target, True
+
+    def bootstrap(self, stale_after=3600):
+        """Load the CURRENT snapshot, building one from the CSVs first if none exists yet.
+
+        Workers starting together race for a lock file, so only one of them builds the first
+        snapshot and the rest wait for CURRENT to appear.
+        """
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        lock_path = os.path.join(self.snapshot_dir, BOOTSTRAP_LOCK)
+
+        version = read_current_version(self.snapshot_dir)
+        while version is None:
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                # Someone else is building; take over only if their lock looks abandoned
+                try:
+                    if time.time() - os.path.getmtime(lock_path) > stale_after:
+                        os.remove(lock_path)
+                except FileNotFoundError:
+                    pass
+                time.sleep(1)
+                version = read_current_version(self.snapshot_dir)
+                continue
+
+            try:
+                os.close(fd)
+                version = read_current_version(self.snapshot_dir)
+                if version is None:
+                    model = self._get_model(MODEL_NAME)
+                    version = build_snapshot(model_name=MODEL_NAME, snapshot_dir=self.snapshot_dir, model=model)
+                    write_current_version(version, self.snapshot_dir)
+            finally:
+                os.remove(lock_path)
+
+        try:
+            return self.load(version)
+        except Exception as e:
+            # CURRENT is broken: serve the newest snapshot that loads instead of failing to start
+            self.last_error = f"{version}: {e}"
+            self.failed_version = version
+            print(f"❌ ERROR: Could not load snapshot {version}: {e}")
+        for fallback in reversed(list_versions(self.snapshot_dir)):
+            if fallback == version:
+                continue
+            try:
+                snapshot = self.load(fallback)
+            except Exception as e:
+                print(f"❌ ERROR: Could not load snapshot {fallback}: {e}")
+                continue
+            print(f"⚠️ Serving fallback snapshot {fallback}")
+            return snapshot
+        raise RuntimeError(f"❌ ERROR: No loadable snapshot in {self.snapshot_dir}")
+
+    def watch(self, interval=10):
+        """Poll the CURRENT pointer so every worker process follows activations and rollbacks."""
+        def run():
+            while True:
+                time.sleep(interval)
+                version = read_current_version(self.snapshot_dir)
+                active = self.active
+                if (version and (active is None or version != active.version)
+                        and version != self.loading and version != self.failed_version):
+                    self.load_async(version)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def status(self):
+        active, previous = self.active, self.previous
+        return {
+            "active_version": active.version if active else None,
+            "previous_version": previous.version if previous else None,
+            "current_pointer": read_current_version(self.snapshot_dir),
+            "previous_pointer": read_previous_version(self.snapshot_dir),
+            "loading": self.loading,
+            "last_error": self.last_error,
+            "failed_version": self.failed_version,
+            "versions": list_versions(self.snapshot_dir),
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a catalogue snapshot for app.py")
+    parser.add_argument("--books", default=BOOKS_CSV_PATH)
+    parser.add_argument("--friends", default=FRIENDS_CSV_PATH)
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--snapshot-dir", default=SNAPSHOT_DIR)
+    parser.add_argument("--activate", action="store_true", help="Point CURRENT at the new snapshot")
+    args = parser.parse_args()
+
+    encoder = SentenceTransformer(args.model)
+    new_version = build_snapshot(args.books, args.friends, args.model, args.snapshot_dir, model=encoder)
+    print(f"✅ Built snapshot {new_version}")
+    if args.activate:
+        # Make sure the snapshot loads before any worker is pointed at it
+        Snapshot(os.path.join(args.snapshot_dir, new_version), encoder)
+        write_current_version(new_version, args.snapshot_dir)
+        print(f"🔄 CURRENT now points to {new_version}")
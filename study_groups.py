@@ -0,0 +1,198 @@
+import json
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import datetime, timezone
+
+from sentence_transformers import util
+
+
+# Groups, memberships and discussions live in one SQLite file shared by every worker process
+STUDY_GROUPS_DB_PATH = "study_groups.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS study_groups (
+    group_name TEXT PRIMARY KEY,
+    discussion_topic TEXT NOT NULL,
+    active_status TEXT NOT NULL,
+    book_sharing TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS memberships (
+    group_name TEXT NOT NULL REFERENCES study_groups (group_name),
+    username TEXT NOT NULL,
+    PRIMARY KEY (group_name, username)
+);
+CREATE INDEX IF NOT EXISTS memberships_by_user ON memberships (username, group_name);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    group_name TEXT NOT NULL REFERENCES study_groups (group_name),
+    user TEXT NOT NULL,
+    message TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_by_group ON messages (group_name, id);
+"""
+
+
+class StudyGroupStore:
+    """Study groups backed by SQLite, with a user -> groups index and per-group discussion logs."""
+
+    def __init__(self, seed_groups, model, db_path=STUDY_GROUPS_DB_PATH):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")  # Readers don't block the writer
+            conn.executescript(SCHEMA)
+
+            # 🔹 Seed groups on first run; BEGIN IMMEDIATE so concurrent workers seed only once
+            conn.execute("BEGIN IMMEDIATE")
+            for group in seed_groups:
+                inserted = conn.execute(
+                    "INSERT OR IGNORE INTO study_groups VALUES (?, ?, ?, ?)",
+                    (group["group_name"], group["discussion_topic"], group["active_status"],
+                     json.dumps(group["book_sharing"], ensure_ascii=False)),
+                ).rowcount
+                if inserted:
+                    conn.executemany("INSERT OR IGNORE INTO memberships VALUES (?, ?)",
+                                     [(group["group_name"], member) for member in group["members"]])
+            conn.execute("COMMIT")
+
+        self.reindex(model)
+
+    def _connect(self):
+        # One short-lived connection per call keeps this safe across Flask threads
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _load_groups(self, conn, where="", params=()):
+        rows = conn.execute(f"SELECT * FROM study_groups {where} ORDER BY rowid", params).fetchall()
+
+        # 🔹 Members of every selected group in a single query
+        members = {row["group_name"]: [] for row in rows}
+        member_rows = conn.execute(
+            f"SELECT group_name, username FROM memberships "
+            f"WHERE group_name IN (SELECT group_name FROM study_groups {where}) ORDER BY rowid",
+            params,
+        ).fetchall()
+        for member in member_rows:
+            members[member["group_name"]].append(member["username"])
+
+        groups = []
+        for row in rows:
+            groups.append({
+                "group_name": row["group_name"],
+                "members": members[row["group_name"]],
+                "book_sharing": json.loads(row["book_sharing"]),
+                "discussion_topic": row["discussion_topic"],
+                "active_status": row["active_status"],
+            })
+        return groups
+
+    def reindex(self, model):
+        """Precompute one topic embedding per group so suggestions only encode the user query."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT group_name, discussion_topic FROM study_groups ORDER BY rowid").fetchall()
+        names = [row["group_name"] for row in rows]
+        topics = [f"{row['group_name']}. {row['discussion_topic']}" for row in rows]
+        embeddings = model.encode(topics, convert_to_tensor=True) if topics else None
+        with self.lock:
+            self.model = model
+            self.topic_names = names
+            self.topic_embeddings = embeddings
+
+    def list_groups(self):
+        with closing(self._connect()) as conn:
+            return self._load_groups(conn)
+
+    def get_group(self, group_name):
+        with closing(self._connect()) as conn:
+            groups = self._load_groups(conn, "WHERE group_name = ?", (group_name,))
+        return groups[0] if groups else None
+
+    def groups_for_user(self, username):
+        with closing(self._connect()) as conn:
+            return self._load_groups(
+                conn, "WHERE group_name IN (SELECT group_name FROM memberships WHERE username = ?)", (username,))
+
+    def _group_names_for_user(self, conn, username):
+        rows = conn.execute("SELECT group_name FROM memberships WHERE username = ?", (username,)).fetchall()
+        return {row["group_name"] for row in rows}
+
+    def join(self, group_name, username):
+        """Add a user to a group. Returns False if the group does not exist."""
+        with closing(self._connect()) as conn:
+            if not conn.execute("SELECT 1 FROM study_groups WHERE group_name = ?", (group_name,)).fetchone():
+                return False
+            conn.execute("INSERT OR IGNORE INTO memberships VALUES (?, ?)", (group_name, username))
+            return True
+
+    def leave(self, group_name, username):
+        """Remove a user from a group. Returns False if the group does not exist."""
+        with closing(self._connect()) as conn:
+            if not conn.execute("SELECT 1 FROM study_groups WHERE group_name = ?", (group_name,)).fetchone():
+                return False
+            conn.execute("DELETE FROM memberships WHERE group_name = ? AND username = ?", (group_name, username))
+            return True
+
+    def is_member(self, group_name, username):
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT 1 FROM memberships WHERE group_name = ? AND username = ?",
+                                (group_name, username)).fetchone() is not None
+
+    def post_message(self, group_name, username, message):
+        """Append a message to the group's discussion log and return the stored entry."""
+        created_at = datetime.now(timezone.utc).isoformat()
+        with closing(self._connect()) as conn:
+            # AUTOINCREMENT ids are unique across workers and only ever grow, so they double as cursors
+            message_id = conn.execute(
+                "INSERT INTO messages (group_name, user, message, created_at) VALUES (?, ?, ?, ?)",
+                (group_name, username, message, created_at),
+            ).lastrowid
+        return {"id": message_id, "group_name": group_name, "user": username,
+                "message": message, "created_at": created_at}
+
+    def get_messages(self, group_name, cursor=0, limit=20):
+        """Return up to `limit` messages with an id greater than `cursor` (oldest first), plus the next cursor."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT * FROM messages WHERE group_name = ? AND id > ? ORDER BY id LIMIT ?",
+                (group_name, cursor, limit + 1),
+            ).fetchall()
+        page = [dict(row) for row in rows[:limit]]
+        next_cursor = page[-1]["id"] if len(rows) > limit else None
+        return page, next_cursor
+
+    def get_latest_messages(self, group_name, before=None, limit=20):
+        """Return the newest `limit` messages with an id below `before` (oldest first), plus a cursor for older ones."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT * FROM messages WHERE group_name = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (group_name, before if before is not None else 2 ** 63 - 1, limit + 1),
+            ).fetchall()
+        page = [dict(row) for row in reversed(rows[:limit])]
+        older_cursor = page[0]["id"] if len(rows) > limit else None
+        return page, older_cursor
+
+    def suggest(self, username, categories, top_k=3):
+        """Rank groups the user hasn't joined by similarity between their categories and each group's topic."""
+        with self.lock:
+            model, names, embeddings = self.model, self.topic_names, self.topic_embeddings
+        if not categories or embeddings is None:
+            return []
+
+        query_embedding = model.encode(" ".join(categories), convert_to_tensor=True)
+        similarity_scores = util.pytorch_cos_sim(query_embedding, embeddings)[0]
+
+        with closing(self._connect()) as conn:
+            joined = self._group_names_for_user(conn, username)
+            candidates = [(name, score) for name, score in zip(names, similarity_scores.tolist()) if name not in joined]
+            scores = dict(sorted(candidates, key=lambda x: x[1], reverse=True)[:top_k])
+            if not scores:
+                return []
+            placeholders = ", ".join("?" * len(scores))
+            groups = self._load_groups(conn, f"WHERE group_name IN ({placeholders})", tuple(scores))
+
+        groups.sort(key=lambda group: scores[group["group_name"]], reverse=True)
+        return [dict(group, score=round(scores[group["group_name"]], 4)) for group in groups]
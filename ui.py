@@ -3,10 +3,35 @@ import requests
 import pandas as pd
 from st_aggrid import AgGrid
 from fuzzywuzzy import process
-from app import friend_data, shop_items, study_groups, leaderboard_data
 
 st.set_page_config(page_title="Book Exchange", layout="wide")
 
+
+# 🔹 Study group actions run as button callbacks, so their result survives the rerun that follows
+def flash(level, message):
+    st.session_state["group_flash"] = (level, message)
+
+def update_membership(action, group_name):
+    response = requests.post(f"http://127.0.0.1:5000/study_groups/{action}", json={"username": st.session_state["username"], "group_name": group_name})
+    if response.status_code == 200:
+        st.session_state.pop("group_suggestions", None)  # Joined groups drop out of the suggestions
+        flash("success", response.json()["message"])
+    else:
+        flash("error", response.json().get("error", f"⚠️ Could not {action} group."))
+
+def post_to_group(group_name):
+    text_key = f"discuss_text_{group_name}"
+    response = requests.post("http://127.0.0.1:5000/study_groups/discussion", json={
+        "username": st.session_state["username"],
+        "group_name": group_name,
+        "message": st.session_state.get(text_key, ""),
+    })
+    if response.status_code == 200:
+        st.session_state[text_key] = ""  # Clear the box so the same text isn't posted twice
+        flash("success", f"💬 Posted in **{group_name}**!")
+    else:
+        flash("error", response.json().get("error", "⚠️ Could not post message."))
+
 if "username" not in st.session_state:
     st.session_state["username"] = None
     st.session_state["preferences"] = None
@@ -138,6 +163,9 @@ else:
         if tab == "Shop":
             st.header("🛍️ Redeem Rewards with Points")
 
+            response = requests.get("http://127.0.0.1:5000/shop")
+            shop_items = response.json().get("shop_items", []) if response.status_code == 200 else []
+
             # Fetch user's points (assumed session state tracks points)
             user_points = st.session_state.get("user_points", 0)
 
@@ -168,6 +196,14 @@ else:
         elif tab == "Friends":
             st.header("👥 Find and Connect with Friends")
 
+            # Friends come from the backend's live catalogue snapshot
+            response = requests.get("http://127.0.0.1:5000/friends")
+            if response.status_code == 200:
+                friend_data = response.json().get("friends", [])
+            else:
+                friend_data = []
+                st.error("⚠️ Error fetching friends. Please try again later.")
+
             # 🔍 Search for a Friend
             st.subheader("🔍 Search for a Friend")
             friend_search = st.text_input("Enter a friend's name:")
@@ -242,8 +278,37 @@ else:
         elif tab == "Study Groups":
             st.header("📚 Study Groups")
 
+            username = st.session_state["username"]
+
+            # Result of the last join / leave / post
+            if "group_flash" in st.session_state:
+                level, message = st.session_state.pop("group_flash")
+                getattr(st, level)(message)
+
+            # Suggested groups based on saved preferences, cached until preferences or memberships change
+            preferences_key = tuple(sorted(st.session_state.get("preferences") or []))
+            cached = st.session_state.get("group_suggestions")
+            if cached and cached[0] == preferences_key:
+                suggested_groups = cached[1]
+            else:
+                response = requests.get(f"http://127.0.0.1:5000/study_groups/suggest?username={username}")
+                suggested_groups = response.json().get("suggested_groups", []) if response.status_code == 200 else []
+                if response.status_code == 200:
+                    st.session_state["group_suggestions"] = (preferences_key, suggested_groups)
+            if suggested_groups:
+                st.markdown("### ✨ Suggested for You")
+                st.write(", ".join(f"**{group['group_name']}**" for group in suggested_groups))
+
+            response = requests.get("http://127.0.0.1:5000/study_groups")
+            if response.status_code == 200:
+                study_groups = response.json().get("study_groups", [])
+            else:
+                study_groups = []
+                st.error("⚠️ Error fetching study groups. Please try again later.")
+
             # Display Study Groups
             for group in study_groups:
+                is_member = username in group["members"]
                 with st.expander(f"📚 {group['group_name']} - {group['active_status']}"):
                     st.markdown(f"👥 **Members:** {', '.join(group['members'])}")
                     st.markdown(f"💬 **Discussion Topic:** {group['discussion_topic']}")
@@ -252,13 +317,27 @@ else:
                     shared_books = [f"{entry['user']} is sharing '{entry['book']}'" for entry in group['book_sharing']]
                     st.markdown(f"📖 **Books Shared:** {', '.join(shared_books)}")
 
-                    # Join Group Button
-                    if st.button(f"Join {group['group_name']}", key=f"join_{group['group_name']}"):
-                        st.success(f"✅ You joined **{group['group_name']}**! Start discussing now.")
+                    # Join / Leave Group Buttons
+                    if is_member:
+                        st.button(f"Leave {group['group_name']}", key=f"leave_{group['group_name']}",
+                                  on_click=update_membership, args=("leave", group["group_name"]))
+                    else:
+                        st.button(f"Join {group['group_name']}", key=f"join_{group['group_name']}",
+                                  on_click=update_membership, args=("join", group["group_name"]))
+
+                    # Latest discussion messages, only fetched once the user opens them
+                    # (expander bodies run on every rerun, even when collapsed)
+                    if st.checkbox("💬 Show discussion", key=f"show_discussion_{group['group_name']}"):
+                        response = requests.get("http://127.0.0.1:5000/study_groups/discussion", params={"group_name": group["group_name"]})
+                        if response.status_code == 200:
+                            for entry in response.json().get("messages", []):
+                                st.write(f"🗨️ **{entry['user']}:** {entry['message']}")
 
-                    # Start Discussion Button
-                    if st.button(f"Start Discussion in {group['group_name']}", key=f"discuss_{group['group_name']}"):
-                        st.text_area(f"💬 Share your thoughts in **{group['group_name']}**:")
+                    # Post to the discussion
+                    if is_member:
+                        st.text_area(f"💬 Share your thoughts in **{group['group_name']}**:", key=f"discuss_text_{group['group_name']}")
+                        st.button(f"Post in {group['group_name']}", key=f"discuss_{group['group_name']}",
+                                  on_click=post_to_group, args=(group["group_name"],))
 
 
         elif tab == "Leaderboard":
@@ -306,6 +385,8 @@ else:
                 )
 
             # Styled Leaderboard Data
+            response = requests.get("http://127.0.0.1:5000/leaderboard")
+            leaderboard_data = response.json().get("leaderboard", []) if response.status_code == 200 else []
             df_leaderboard = pd.DataFrame(leaderboard_data)
 
             # Leaderboard Section Title